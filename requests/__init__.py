@@ -10,12 +10,18 @@ This means that some headers are included by default, even though they might not
 It also means cookies are handled mostly by the browser and a bit less by requests.Session.
 This way, Python code can use authenticated sessions that already exist in the browser.
 """
+import base64
+import hashlib
 import json as json_module  # Renamed to avoid unintentional shadowing by the json parameter in the request() method
-from collections import Mapping
+import os
+import traceback
+import zlib
+from collections.abc import Mapping
 from email.parser import Parser
 from urllib.parse import urlencode
 
 from js import Blob, XMLHttpRequest
+from pyodide import JsException, to_js
 
 from .exceptions import *
 from .hooks import default_hooks
@@ -23,6 +29,11 @@ from .status_codes import *
 from .structures import CaseInsensitiveDict
 
 DEFAULT_REDIRECT_LIMIT = 30
+DEFAULT_DOWNLOAD_PARTS = 1
+DEFAULT_DOWNLOAD_RETRIES = 2
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+RESUME_SUFFIX = '.resume'
 
 
 class Session:
@@ -84,13 +95,27 @@ class Session:
     def request(self, *a, **k):
         return request(*a, **k)
 
+    def download(self, *a, **k):
+        return download(*a, **k)
+
+    def batch(self, *a, **k):
+        return Batch(*a, **k)
+
 
 class Response:
+    """
+    The response to a request.
+
+    The body is kept once, in ``raw``; ``text`` is derived from it on access. A response holds no references to JS
+    objects, so the XMLHttpRequest and its JS-side copy of the body can be freed as soon as :func:`request` returns.
+    """
+    __slots__ = ('raw', 'status_code', 'headers')
+
     def __init__(self, request):
         if request.responseType == 'blob':
+            # The blob, promise and buffer proxies are temporaries, freed as soon as the bytes have been copied
             self.raw = bytes(request.response.arrayBuffer().result().to_py())
         else:
-            self.text = str(request.response)
             self.raw = str(request.response)
         self.status_code = request.status
         try:
@@ -101,49 +126,503 @@ class Response:
             self.headers = CaseInsensitiveDict({})
             print(e)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _charset(self):
+        """The charset from the ``Content-Type`` header, or ``None`` if it has none."""
+        for param in self.headers.get('Content-Type', '').split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'charset':
+                return value.strip('"\'')
+        return None
+
+    @property
+    def text(self):
+        if not isinstance(self.raw, bytes):
+            return self.raw
+        try:
+            return self.raw.decode(self._charset() or 'utf-8', errors='replace')
+        except LookupError:  # Unknown charset
+            return self.raw.decode('utf-8', errors='replace')
+
+    def _bytes(self):
+        """
+        The body as bytes.
+
+        Without ``stream=True`` the browser has already decoded the body, so it is encoded again with the charset from
+        the ``Content-Type`` header (or UTF-8). That gives back the bytes the server sent only if they were valid in
+        that charset.
+        """
+        if isinstance(self.raw, bytes):
+            return self.raw
+        try:
+            return self.raw.encode(self._charset() or 'utf-8', errors='replace')
+        except LookupError:  # Unknown charset
+            return self.raw.encode('utf-8', errors='replace')
+
+    def close(self):
+        """Kept for compatibility with requests; a response holds no JS objects to release."""
+
+    @classmethod
+    def _from_parts(cls, status_code, headers, raw):
+        """Build a response that did not come from its own XMLHttpRequest, like one unpacked from a batch."""
+        response = cls.__new__(cls)
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(headers or {})
+        response.raw = raw
+        return response
+
     def json(self):
         return json_module.loads(self.text)
 
-    def iter_content(self, *a, **k):
-        yield self.raw
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        """
+        Iterate over the body in pieces of ``chunk_size``, or as one piece if it is ``None``.
+
+        Pieces are ``bytes``, or ``str`` with ``decode_unicode``. Use ``stream=True`` to get exactly the bytes the server
+        sent; see :meth:`save_to`.
+        """
+        content = self.text if decode_unicode else self._bytes()
+        if chunk_size is None:
+            yield content
+            return
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def save_to(self, dest, chunk_size=DEFAULT_CHUNK_SIZE, checksum=None, progress=None):
+        """
+        Write the body to a path or a binary file object, one chunk at a time.
+
+        The file and the checksum are only guaranteed to match what the server sent for responses to requests made with
+        ``stream=True``. Other responses have been decoded by the browser, and are encoded again with the charset from
+        the ``Content-Type`` header (or UTF-8).
+
+        :param dest: path (for example in MEMFS or IDBFS) or writable binary file object.
+        :param chunk_size: number of bytes written per call to ``write``.
+        :param checksum: (optional) ``'<algorithm>:<hexdigest>'``, for example ``'sha256:9f86d0...'``, verified while
+            writing. On a mismatch :exc:`ChecksumError` is raised and a file written to a path is removed.
+        :param progress: (optional) callable that gets ``(bytes_written, total_bytes)`` after every chunk.
+        :return: the number of bytes written.
+        """
+        digest = expected = None
+        if checksum:
+            algorithm, _, expected = checksum.partition(':')
+            digest = hashlib.new(algorithm)
+        content = memoryview(self._bytes())
+        is_path = isinstance(dest, (str, os.PathLike))
+        f = open(dest, 'wb') if is_path else dest
+        written = 0
+        try:
+            for start in range(0, len(content), chunk_size):
+                chunk = content[start:start + chunk_size]
+                f.write(chunk)
+                if digest:
+                    digest.update(chunk)
+                written += len(chunk)
+                if progress:
+                    progress(written, len(content))
+        finally:
+            if is_path:
+                f.close()
+        if digest and digest.hexdigest() != expected.lower():
+            if is_path:
+                os.remove(dest)
+            raise ChecksumError(f'{digest.name} checksum mismatch: expected {expected}, got {digest.hexdigest()}',
+                                response=self)
+        return written
+
+
+class Batch:
+    """
+    Collects small requests and sends them to a batch endpoint in one round trip.
+
+    Requests made through a batch are not sent right away. Each returns a :class:`BatchedResponse` placeholder. All
+    pending requests are sent as one JSON POST when ``max_size`` requests are pending, when :meth:`flush` is called,
+    when the ``with`` block ends, or when a placeholder is first used. If sending the batch fails, the error is raised
+    from :meth:`flush` (or the ``with`` block) and again from every placeholder in it. When reaching ``max_size``
+    triggered the flush, the placeholder is still returned, and the error is only raised when it is used.
+
+    The batch endpoint receives ``{"requests": [{"method", "url", "headers", <body>}, ...]}`` and is expected to reply
+    with ``{"responses": [{"status", "headers", <body>}, ...]}`` in the same order. ``<body>`` is at most one of
+    ``"json"`` (any JSON value), ``"body"`` (a string) or ``"body_base64"`` (base64 encoded bytes).
+
+        with requests.Session().batch('https://example.com/batch') as batch:
+            a = batch.get('/items/1')
+            b = batch.post('/items', json={'name': 'c'})
+        a.json(), b.status_code
+    """
+
+    def __init__(self, endpoint, max_size=DEFAULT_BATCH_SIZE, headers=None):
+        self.endpoint = endpoint
+        self.max_size = max_size
+        self.headers = headers
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.flush()
+
+    def request(self, method, url, params=None, data=None, headers=None, json=None):
+        if params and isinstance(params, Mapping):
+            url = url + '?' + urlencode(params)
+        entry = {
+            'method': method.upper(),
+            'url': url,
+            'headers': dict(headers or {}),
+        }
+        if data:  # Like request(), data takes precedence over json
+            if isinstance(data, Mapping):
+                _set_batched_json(entry, data)
+            elif isinstance(data, str):
+                entry['body'] = data
+            elif isinstance(data, (bytes, bytearray)):
+                entry['body_base64'] = base64.b64encode(data).decode('ascii')
+            else:
+                raise TypeError(f'Batched requests take a Mapping, str or bytes body, not {type(data).__name__}')
+        elif json is not None:
+            _set_batched_json(entry, json)
+        placeholder = BatchedResponse(self)
+        self._pending.append((entry, placeholder))
+        if len(self._pending) >= self.max_size:
+            try:
+                self.flush()
+            except Exception:
+                pass  # Recorded on every placeholder in the batch, this one included, and raised when it is used
+        return placeholder
+
+    def flush(self):
+        """Send all pending requests as one batch request and resolve their placeholders."""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            responses = self._send([entry for entry, _ in pending])
+        except Exception as e:
+            for _, placeholder in pending:
+                placeholder._error = e
+            raise
+        for (_, placeholder), response in zip(pending, responses):
+            placeholder._response = response
+
+    def _send(self, entries):
+        with post(self.endpoint, json={'requests': entries}, headers=self.headers) as reply:
+            if not 200 <= reply.status_code < 300:
+                raise HTTPError(f'{reply.status_code} from batch endpoint {self.endpoint}', response=reply)
+            try:
+                results = reply.json()['responses']
+                if len(results) != len(entries):
+                    raise ValueError(f'{len(results)} responses for {len(entries)} requests')
+                return [Response._from_parts(result['status'], result.get('headers'), _batched_body(result))
+                        for result in results]
+            except (ValueError, KeyError, TypeError) as e:
+                raise InvalidJSONError(f'Malformed reply from batch endpoint {self.endpoint}: {e}',
+                                       response=reply) from e
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('get', url, params=params, **kwargs)
+
+    def options(self, url, **kwargs):
+        return self.request('options', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('head', url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('post', url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request('put', url, data=data, **kwargs)
+
+    def patch(self, url, data=None, **kwargs):
+        return self.request('patch', url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('delete', url, **kwargs)
+
+
+def _set_batched_json(entry, value):
+    try:
+        json_module.dumps(value)  # Fail here, rather than when the whole batch is sent
+    except (TypeError, ValueError) as e:
+        raise InvalidJSONError(e) from e
+    entry['json'] = value
+    if not any(header.lower() == 'content-type' for header in entry['headers']):
+        entry['headers']['Content-Type'] = 'application/json'
+
+
+def _batched_body(result):
+    if 'json' in result:
+        return json_module.dumps(result['json'])
+    if 'body_base64' in result:
+        return base64.b64decode(result['body_base64'])
+    body = result.get('body')
+    if body is None:
+        return ''
+    if not isinstance(body, str):
+        raise TypeError(f'body must be a string, not {type(body).__name__}')
+    return body
+
+
+class BatchedResponse:
+    """
+    Placeholder for a :class:`Response` to a request in a :class:`Batch`.
+
+    Attribute access is passed on to the real response, flushing the batch first if it has not been sent yet. If the
+    batch could not be sent, attribute access raises the error that sending it raised.
+    """
+    __slots__ = ('_batch', '_response', '_error')
+
+    def __init__(self, batch):
+        self._batch = batch
+        self._response = None
+        self._error = None
+
+    def __getattr__(self, name):
+        if self._response is None and self._error is None:
+            self._batch.flush()
+        if self._error is not None:
+            raise self._error
+        return getattr(self._response, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        ...
 
 
 def request(method, url,
             params=None, data=None, headers=None, cookies=None, files=None,
             auth=None, timeout=None, allow_redirects=True, proxies=None,
-            hooks=None, stream=None, verify=None, cert=None, json=None):
+            hooks=None, stream=None, verify=None, cert=None, json=None, compress=False):
     request = XMLHttpRequest.new()
-    request.open(method.upper(), url, False)
-    if params:
-        if isinstance(params, Mapping):
-            url = url + '?' + urlencode(params)
-    if headers:
-        _set_headers(request, headers)
-    if cookies:
-        ...  # TODO set the cookie in the browser, otherwise we rely on the cookies the browser decides to send
-    if stream:
-        request.responseType = "blob"
-    if data:
-        if isinstance(data, Mapping):
-            data = Blob.new([json_module.dumps(data)], {
-                'type': 'application/json',
-            })
-            request.setRequestHeader('Content-Type', 'application/json')
-            request.send(data)
+    body = None
+    try:
+        request.open(method.upper(), url, False)
+        if params:
+            if isinstance(params, Mapping):
+                url = url + '?' + urlencode(params)
+        if headers:
+            _set_headers(request, headers)
+        if cookies:
+            ...  # TODO set the cookie in the browser, otherwise we rely on the cookies the browser decides to send
+        if stream:
+            request.responseType = "blob"
+        if data:  # Like requests, data takes precedence over json
+            if isinstance(data, Mapping):
+                body = _json_body(request, data, compress)
+            elif isinstance(data, (str, bytes, bytearray, memoryview)):
+                body = _raw_body(request, data, compress)
+            else:
+                raise TypeError(f'data must be a Mapping, str or bytes-like object, not {type(data).__name__}')
+        elif json is not None:
+            body = _json_body(request, json, compress)
+        if body is not None:
+            request.send(body)
         else:
-            ...
-    if json:
-        if isinstance(json, Mapping):
-            data = Blob.new([json_module.dumps(json)], {
-                'type': 'application/json',
-            })
-            request.setRequestHeader('Content-Type', 'application/json')
-            request.send(data)
+            request.send()
+        return Response(request)
+    except BaseException as e:
+        # A traceback keeps the frames below this one alive, and they reference the XMLHttpRequest
+        traceback.clear_frames(e.__traceback__)
+        if isinstance(e, JsException):
+            # Network errors, CORS rejections, aborts and invalid use of the XMLHttpRequest (like a bad URL)
+            raise ConnectionError(f'{method.upper()} {url} failed: {e}') from e
+        raise
+    finally:
+        # Response copied everything it needs. Dropping the last references frees the XMLHttpRequest, and with it the
+        # JS-side copy of the body, right away, even when this frame lives on in a traceback
+        request = body = None
+
+
+def _json_body(request, obj, compress):
+    try:
+        if compress:
+            content = _gzip(json_module.JSONEncoder().iterencode(obj))
         else:
-            ...
+            content = json_module.dumps(obj)
+    except (TypeError, ValueError) as e:
+        raise InvalidJSONError(e) from e
+    request.setRequestHeader('Content-Type', 'application/json')
+    if not compress:
+        return Blob.new([content], {
+            'type': 'application/json',
+        })
+    request.setRequestHeader('Content-Encoding', 'gzip')
+    return _bytes_blob(content, {
+        'type': 'application/json',
+    })
+
+
+def _raw_body(request, data, compress):
+    if not compress:
+        return data if isinstance(data, str) else _bytes_blob(data)
+    request.setRequestHeader('Content-Encoding', 'gzip')
+    return _bytes_blob(_gzip([data]))
+
+
+def _bytes_blob(data, options=None):
+    return Blob.new([to_js(data)], options or {})
+
+
+def _gzip(pieces, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Gzip an iterable of ``str`` or bytes-like pieces incrementally.
+
+    Pieces are collected up to ``chunk_size`` bytes before being handed to the compressor, so a JSON document from
+    ``JSONEncoder.iterencode`` is never held in memory as one uncompressed string.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    compressed = []
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece.encode('utf-8') if isinstance(piece, str) else piece
+        if len(buffer) >= chunk_size:
+            compressed.append(compressor.compress(buffer))
+            buffer.clear()
+    compressed.append(compressor.compress(buffer))
+    compressed.append(compressor.flush())
+    return b''.join(compressed)
+
+
+def download(url, dest=None, parts=DEFAULT_DOWNLOAD_PARTS, resume=False, retries=DEFAULT_DOWNLOAD_RETRIES,
+             headers=None, **kwargs):
+    """
+    Download a (large) file by splitting it into byte ranges.
+
+    A HEAD request is sent first. If the server advertises ``Accept-Ranges: bytes`` and a ``Content-Length``, the file
+    is fetched as ``parts`` ranged GET requests that are written into one preallocated buffer (or into ``dest`` at the
+    right offset). Otherwise the file is fetched as a single stream.
+
+    Since requests are sent with a synchronous XMLHttpRequest, the ranges are fetched one after the other, not in
+    parallel: every extra part costs an extra round trip. Splitting only pays off for a large file on an unreliable
+    connection, where a failed range can be retried or resumed on its own instead of restarting the whole download.
+
+    Range requests carry an ``If-Range`` header with the ``ETag`` (or ``Last-Modified``) from the HEAD response, so a
+    file that changes on the server during the download raises :exc:`HTTPError` instead of being stitched together.
+
+    When ``dest`` is a path, ranges are written to it in order and a ``<dest>.resume`` file records the validator the
+    download started with. It is removed once the download is complete. Without a validator the server's file can't
+    be told apart from a newer version, so no ``<dest>.resume`` file is written and the download can't be resumed.
+
+    :param dest: (optional) path or binary file object to write to. If omitted, the content is returned.
+    :param parts: number of byte ranges to split the file into, fetched one after the other.
+    :param resume: if ``dest`` is a path left behind by an unfinished download of the same version of the file, only
+        fetch the bytes that are not in it yet.
+    :param retries: how many times a failed range is retried before giving up.
+    :return: the content if ``dest`` was omitted (a ``bytearray`` when fetched in ranges, so the buffer isn't copied),
+        otherwise the number of bytes in the file.
+    """
+    headers = dict(headers or {})
+    with head(url, headers=headers, **kwargs) as response:
+        try:
+            length = int(response.headers.get('Content-Length') or 0)
+        except ValueError:  # Malformed header, so don't trust the server with ranges either
+            length = 0
+        ranged = response.headers.get('Accept-Ranges', '').lower() == 'bytes' and length > 0
+        validator = _range_validator(response.headers)
+
+    is_path = isinstance(dest, (str, os.PathLike))
+    if is_path:
+        state = os.fspath(dest) + RESUME_SUFFIX
+    if not ranged or not validator:
+        if is_path and os.path.exists(state):  # Left behind by an earlier download that can't be resumed now
+            os.remove(state)
+    if not ranged:
+        with request('get', url, headers=headers, stream=True, **kwargs) as response:
+            _raise_for_download_status(response, url)
+        if dest is None:
+            return response.raw
+        return response.save_to(dest)
+
+    if validator:
+        headers['If-Range'] = validator
+    start = 0
+    if is_path:
+        if resume and validator and os.path.exists(dest) and _read_resume_state(state) == validator:
+            start = min(os.path.getsize(dest), length)
+        target = open(dest, 'r+b' if start else 'wb')
+        if validator:
+            with open(state, 'w') as f:
+                f.write(validator)
+    elif dest is None:
+        buffer = bytearray(length)
+        target = memoryview(buffer)
     else:
-        request.send()
-    return Response(request)
+        target = dest
+
+    try:
+        for first, last in _byte_ranges(start, length, parts):
+            content = _fetch_range(url, first, last, headers, retries, **kwargs)
+            if isinstance(target, memoryview):
+                target[first:last + 1] = content
+            else:
+                target.seek(first)
+                target.write(content)
+        if is_path:
+            target.truncate(length)
+    finally:
+        if is_path:
+            target.close()
+
+    if is_path and validator:
+        os.remove(state)
+    if dest is None:
+        return buffer
+    return length
+
+
+def _range_validator(headers):
+    """Pick the strong validator for ``If-Range``: a non-weak ``ETag``, else ``Last-Modified``, else ``''``."""
+    etag = headers.get('ETag', '')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified', '')
+
+
+def _read_resume_state(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _byte_ranges(start, length, parts):
+    """Split ``start``..``length`` into at most ``parts`` inclusive (first, last) byte ranges."""
+    remaining = length - start
+    if remaining <= 0:
+        return []
+    size = -(-remaining // max(1, parts))  # Ceiling division, so the last range picks up the remainder
+    return [(first, min(first + size, length) - 1) for first in range(start, length, size)]
+
+
+def _fetch_range(url, first, last, headers, retries, **kwargs):
+    range_headers = dict(headers, Range=f'bytes={first}-{last}')
+    for attempt in range(retries + 1):
+        try:
+            with request('get', url, headers=range_headers, stream=True, **kwargs) as response:
+                _raise_for_download_status(response, url, expected=(206,))
+            if len(response.raw) != last - first + 1:
+                raise ChunkedEncodingError(f'Expected {last - first + 1} bytes for range {first}-{last} of {url}, '
+                                           f'got {len(response.raw)}')
+            return response.raw
+        except RequestException as e:
+            # A 200 means the server ignored the range or If-Range saw a changed file; retrying won't help
+            if attempt == retries or getattr(e.response, 'status_code', None) == 200:
+                raise
+
+
+def _raise_for_download_status(response, url, expected=(200,)):
+    if response.status_code not in expected:
+        raise HTTPError(f'{response.status_code} while downloading {url}', response=response)
 
 
 def _set_headers(request, headers):
@@ -163,9 +642,12 @@ __all__ = [
     'put',
     'delete',
     'request',
+    'download',
     'options',
     'head',
     'Response',
+    'Batch',
+    'BatchedResponse',
     "RequestException",
     "InvalidJSONError",
     "HTTPError",
@@ -187,6 +669,7 @@ __all__ = [
     "StreamConsumedError",
     "RetryError",
     "UnrewindableBodyError",
+    "ChecksumError",
     "RequestsWarning",
     "FileModeWarning",
     "RequestsDependencyWarning",
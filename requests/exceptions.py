@@ -118,6 +118,10 @@ class UnrewindableBodyError(RequestException):
     """Requests encountered an error when trying to rewind a body."""
 
 
+class ChecksumError(RequestException):
+    """The content of the response does not match the expected checksum."""
+
+
 # Warnings
 
 
@@ -155,6 +159,7 @@ __all__ = [
     "StreamConsumedError",
     "RetryError",
     "UnrewindableBodyError",
+    "ChecksumError",
     "RequestsWarning",
     "FileModeWarning",
     "RequestsDependencyWarning",
@@ -0,0 +1,141 @@
+"""
+Fake ``js`` and ``pyodide`` modules, so the package can be imported and exercised outside of Pyodide.
+
+``FakeXMLHttpRequest.server`` is a callable that gets a :class:`SentRequest` and returns ``(status, headers, body)``,
+or raises :class:`JsException` to simulate a network failure. Like Pyodide's JsProxy, a fake JS object is released
+when its last Python reference is dropped. ``FakeProxy.live`` holds weak references to the ones that are still alive,
+so tests can check that no proxies are leaked.
+"""
+import os
+import sys
+import types
+import weakref
+
+import pytest
+
+
+class JsException(Exception):
+    """Stand-in for pyodide.JsException."""
+
+
+class FakeProxy:
+    live = weakref.WeakSet()
+
+    def __init__(self):
+        FakeProxy.live.add(self)
+
+
+class FakeUint8Array(FakeProxy):
+    def __init__(self, data):
+        super().__init__()
+        self.data = bytes(data)
+
+
+class FakeArrayBuffer(FakeProxy):
+    def __init__(self, data):
+        super().__init__()
+        self.data = data
+
+    def to_py(self):
+        return memoryview(self.data)
+
+
+class FakePromise(FakeProxy):
+    def __init__(self, data):
+        super().__init__()
+        self.data = data
+
+    def result(self):
+        return FakeArrayBuffer(self.data)
+
+
+class FakeBlob(FakeProxy):
+    def __init__(self, parts=(), options=None):
+        super().__init__()
+        self.data = b''.join(
+            part.encode('utf-8') if isinstance(part, str) else getattr(part, 'data', part) for part in parts
+        )
+        self.options = options
+
+    @classmethod
+    def new(cls, parts, options=None):
+        return cls(parts, options)
+
+    def arrayBuffer(self):
+        return FakePromise(self.data)
+
+
+class SentRequest:
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.header_list = []
+        self.body = None
+
+    @property
+    def headers(self):
+        return dict(self.header_list)
+
+
+class FakeXMLHttpRequest(FakeProxy):
+    server = None
+    sent = []
+
+    def __init__(self):
+        super().__init__()
+        self.responseType = ''
+        self.status = 0
+        self._sent = None
+        self._headers = {}
+        self._body = b''
+
+    @classmethod
+    def new(cls):
+        return cls()
+
+    def open(self, method, url, asynchronous=True):
+        self._sent = SentRequest(method, url)
+
+    def setRequestHeader(self, header, value):
+        self._sent.header_list.append((header, value))
+
+    def send(self, body=None):
+        if isinstance(body, FakeBlob):
+            body = body.data
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        self._sent.body = body
+        FakeXMLHttpRequest.sent.append(self._sent)
+        self.status, self._headers, body = FakeXMLHttpRequest.server(self._sent)
+        self._body = body.encode('utf-8') if isinstance(body, str) else body
+
+    @property
+    def response(self):
+        if self.responseType == 'blob':
+            return FakeBlob([self._body])
+        # Like a browser, decode the text with the charset from the Content-Type header
+        content_type = {header.lower(): value for header, value in self._headers.items()}.get('content-type', '')
+        _, _, charset = content_type.partition('charset=')
+        return self._body.decode(charset.strip('"') or 'utf-8', errors='replace')
+
+    def getAllResponseHeaders(self):
+        return ''.join(f'{header}: {value}\r\n' for header, value in self._headers.items())
+
+
+def to_js(data):
+    return FakeUint8Array(data)
+
+
+sys.modules['js'] = types.SimpleNamespace(Blob=FakeBlob, XMLHttpRequest=FakeXMLHttpRequest)
+sys.modules['pyodide'] = types.SimpleNamespace(JsException=JsException, to_js=to_js)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def xhr():
+    """Reset the fake XMLHttpRequest. Tests set ``xhr.server`` and inspect ``xhr.sent``."""
+    FakeProxy.live.clear()
+    FakeXMLHttpRequest.sent = []
+    FakeXMLHttpRequest.server = lambda sent: (200, {}, b'')
+    yield FakeXMLHttpRequest
+    FakeXMLHttpRequest.server = None
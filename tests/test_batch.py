@@ -0,0 +1,155 @@
+import base64
+import json
+
+import pytest
+
+import requests
+from conftest import JsException
+
+
+class BatchServer:
+    """
+    Stand-in for a batch endpoint at ``/batch``.
+
+    Each batched request is answered by ``handler(entry)``, which returns a response entry. The default echoes the
+    request back as JSON.
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler or (lambda entry: {'status': 200, 'headers': {'X-Url': entry['url']}, 'json': entry})
+        self.batches = []
+
+    def __call__(self, sent):
+        assert (sent.method, sent.url) == ('POST', '/batch')
+        assert sent.headers['Content-Type'] == 'application/json'
+        entries = json.loads(sent.body)['requests']
+        self.batches.append(entries)
+        return 200, {'Content-Type': 'application/json'}, json.dumps({
+            'responses': [self.handler(entry) for entry in entries],
+        })
+
+
+@pytest.fixture
+def server(xhr):
+    xhr.server = BatchServer()
+    return xhr.server
+
+
+def test_replies_are_split_per_request(server):
+    with requests.Session().batch('/batch') as batch:
+        a = batch.get('/items', params={'page': 2})
+        b = batch.post('/items', json={'name': 'c'})
+        c = batch.delete('/items/1')
+    assert len(server.batches) == 1
+    assert a.json()['url'] == '/items?page=2'
+    assert a.headers['x-url'] == '/items?page=2'
+    assert b.json()['json'] == {'name': 'c'}
+    assert b.json()['headers'] == {'Content-Type': 'application/json'}
+    assert c.json()['method'] == 'DELETE'
+    assert c.status_code == 200
+
+
+def test_flush_when_max_size_is_reached(server):
+    batch = requests.Batch('/batch', max_size=2)
+    batch.get('/a')
+    assert server.batches == []
+    batch.get('/b')
+    assert [len(entries) for entries in server.batches] == [2]
+    batch.get('/c')
+    batch.flush()
+    assert [len(entries) for entries in server.batches] == [2, 1]
+
+
+def test_placeholder_flushes_batch(server):
+    batch = requests.Batch('/batch')
+    a = batch.get('/a')
+    b = batch.get('/b')
+    assert server.batches == []
+    assert a.status_code == 200
+    assert len(server.batches) == 1
+    assert b.json()['url'] == '/b'
+    assert len(server.batches) == 1
+
+
+def test_bodies(server):
+    with requests.Batch('/batch') as batch:
+        text = batch.put('/text', data='a,b\n1,2\n', headers={'Content-Type': 'text/csv'})
+        binary = batch.post('/binary', data=b'\x00\xff')
+        both = batch.post('/both', data={'from': 'data'}, json={'from': 'json'})
+        json_string = batch.post('/string', json='a string')
+    entries = server.batches[0]
+    assert entries[0]['body'] == 'a,b\n1,2\n'
+    assert entries[0]['headers'] == {'Content-Type': 'text/csv'}
+    assert base64.b64decode(entries[1]['body_base64']) == b'\x00\xff'
+    assert entries[2]['json'] == {'from': 'data'}
+    assert entries[3]['json'] == 'a string'
+    assert 'body' not in entries[3]
+    assert text.status_code == binary.status_code == both.status_code == json_string.status_code == 200
+
+
+def test_binary_reply(xhr):
+    xhr.server = BatchServer(lambda entry: {'status': 200, 'body_base64': base64.b64encode(b'\x00\xff').decode()})
+    assert requests.Batch('/batch').get('/binary').raw == b'\x00\xff'
+
+
+def test_invalid_bodies_are_rejected_before_queueing(server):
+    batch = requests.Batch('/batch')
+    with pytest.raises(requests.InvalidJSONError):
+        batch.post('/a', json={'when': object()})
+    with pytest.raises(TypeError):
+        batch.post('/a', data=[1, 2])
+    with pytest.raises(TypeError):
+        batch.get('/a', timeout=3)
+    a = batch.get('/a')
+    assert a.status_code == 200
+    assert [len(entries) for entries in server.batches] == [1]
+
+
+def test_http_error_reaches_every_placeholder(xhr):
+    xhr.server = lambda sent: (502, {}, 'Bad Gateway')
+    batch = requests.Batch('/batch')
+    a = batch.get('/a')
+    b = batch.get('/b')
+    with pytest.raises(requests.HTTPError):
+        batch.flush()
+    with pytest.raises(requests.HTTPError):
+        a.status_code
+    with pytest.raises(requests.HTTPError):
+        b.json()
+
+
+def test_malformed_reply_reaches_every_placeholder(xhr):
+    xhr.server = lambda sent: (200, {}, json.dumps({'responses': [{'status': 200}]}))
+    batch = requests.Batch('/batch')
+    a = batch.get('/a')
+    b = batch.get('/b')
+    with pytest.raises(requests.InvalidJSONError):
+        a.status_code
+    with pytest.raises(requests.InvalidJSONError):
+        b.status_code
+
+
+def test_network_error_reaches_every_placeholder(xhr):
+    def drop(sent):
+        raise JsException('NetworkError')
+
+    xhr.server = drop
+    batch = requests.Batch('/batch')
+    a = batch.get('/a')
+    with pytest.raises(requests.ConnectionError):
+        batch.flush()
+    with pytest.raises(requests.ConnectionError):
+        a.text
+
+
+def test_failed_size_triggered_flush_returns_placeholder(xhr):
+    xhr.server = lambda sent: (503, {}, 'Service Unavailable')
+    batch = requests.Batch('/batch', max_size=2)
+    a = batch.get('/a')
+    b = batch.get('/b')
+    assert len(xhr.sent) == 1
+    with pytest.raises(requests.HTTPError):
+        a.status_code
+    with pytest.raises(requests.HTTPError):
+        b.status_code
+    assert len(xhr.sent) == 1
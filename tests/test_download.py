@@ -0,0 +1,153 @@
+import io
+
+import pytest
+
+import requests
+from conftest import JsException
+
+DATA = bytes(range(256)) * 40
+
+
+def ranged_server(data=DATA, etag='"v1"', failures=None):
+    """
+    Serve ``data`` with byte range support. ``failures`` maps a range start to a callable that fails the request.
+    With ``etag=None`` the server sends no validator at all.
+    """
+    failures = failures or {}
+    validator = {'ETag': etag} if etag else {}
+
+    def serve(sent):
+        if sent.method == 'HEAD':
+            return 200, dict(validator, **{'Accept-Ranges': 'bytes', 'Content-Length': str(len(data))}), b''
+        if 'Range' not in sent.headers or (etag and sent.headers.get('If-Range') != etag):
+            return 200, validator, data
+        first, last = map(int, sent.headers['Range'][len('bytes='):].split('-'))
+        if first in failures:
+            return failures[first](sent)
+        return 206, validator, data[first:last + 1]
+
+    return serve
+
+
+def range_starts(sent):
+    return [int(s.headers['Range'][len('bytes='):].split('-')[0]) for s in sent if 'Range' in s.headers]
+
+
+def test_download_into_memory(xhr):
+    xhr.server = ranged_server()
+    content = requests.download('/file', parts=4)
+    assert isinstance(content, bytearray)
+    assert content == DATA
+    assert range_starts(xhr.sent) == [0, 2560, 5120, 7680]
+    assert all(s.headers['If-Range'] == '"v1"' for s in xhr.sent if 'Range' in s.headers)
+
+
+def test_download_defaults_to_one_range(xhr):
+    xhr.server = ranged_server()
+    assert requests.download('/file') == DATA
+    assert [s.method for s in xhr.sent] == ['HEAD', 'GET']
+    assert range_starts(xhr.sent) == [0]
+
+
+def test_download_into_file_object(xhr):
+    xhr.server = ranged_server()
+    f = io.BytesIO()
+    assert requests.Session().download('/file', f, parts=3) == len(DATA)
+    assert f.getvalue() == DATA
+
+
+def test_download_without_range_support(xhr):
+    xhr.server = lambda sent: (200, {'Content-Length': str(len(DATA))}, DATA if sent.method == 'GET' else b'')
+    assert requests.download('/file', parts=4) == DATA
+    assert [s.method for s in xhr.sent] == ['HEAD', 'GET']
+    assert range_starts(xhr.sent) == []
+
+
+def test_malformed_content_length(xhr, tmp_path):
+    dest = tmp_path / 'file.bin'
+    (tmp_path / 'file.bin.resume').write_text('"v1"')
+
+    def serve(sent):
+        return 200, {'Accept-Ranges': 'bytes', 'Content-Length': 'many'}, DATA if sent.method == 'GET' else b''
+
+    xhr.server = serve
+    assert requests.download('/file', dest, parts=4, resume=True) == len(DATA)
+    assert dest.read_bytes() == DATA
+    assert range_starts(xhr.sent) == []
+    assert not (tmp_path / 'file.bin.resume').exists()
+
+
+def test_network_error_is_retried(xhr):
+    attempts = []
+
+    def drop_once(sent):
+        attempts.append(sent)
+        if len(attempts) == 1:
+            raise JsException('NetworkError')
+        return 206, {}, DATA[2560:5120]
+
+    xhr.server = ranged_server(failures={2560: drop_once})
+    assert requests.download('/file', parts=4) == DATA
+    assert len(attempts) == 2
+
+
+def test_resume_after_failed_range(xhr, tmp_path):
+    dest = tmp_path / 'file.bin'
+    xhr.server = ranged_server(failures={5120: lambda sent: (503, {}, b'')})
+    with pytest.raises(requests.HTTPError):
+        requests.download('/file', dest, parts=4, retries=1)
+    assert dest.read_bytes() == DATA[:5120]
+    assert (tmp_path / 'file.bin.resume').read_text() == '"v1"'
+
+    xhr.sent = []
+    xhr.server = ranged_server()
+    assert requests.download('/file', dest, parts=2, resume=True) == len(DATA)
+    assert dest.read_bytes() == DATA
+    assert range_starts(xhr.sent) == [5120, 7680]
+    assert not (tmp_path / 'file.bin.resume').exists()
+
+
+def test_resume_restarts_when_file_changed(xhr, tmp_path):
+    dest = tmp_path / 'file.bin'
+    xhr.server = ranged_server(failures={5120: lambda sent: (503, {}, b'')})
+    with pytest.raises(requests.HTTPError):
+        requests.download('/file', dest, parts=4, retries=0)
+
+    changed = DATA[::-1]
+    xhr.sent = []
+    xhr.server = ranged_server(changed, etag='"v2"')
+    requests.download('/file', dest, parts=4, resume=True)
+    assert dest.read_bytes() == changed
+    assert range_starts(xhr.sent) == [0, 2560, 5120, 7680]
+
+
+def test_no_resume_without_validator(xhr, tmp_path):
+    dest = tmp_path / 'file.bin'
+    xhr.server = ranged_server(etag=None, failures={5120: lambda sent: (503, {}, b'')})
+    with pytest.raises(requests.HTTPError):
+        requests.download('/file', dest, parts=4, retries=0)
+    assert not (tmp_path / 'file.bin.resume').exists()
+
+    changed = DATA[::-1]
+    xhr.sent = []
+    xhr.server = ranged_server(changed, etag=None)
+    requests.download('/file', dest, parts=4, resume=True)
+    assert dest.read_bytes() == changed
+    assert range_starts(xhr.sent) == [0, 2560, 5120, 7680]
+    assert not any('If-Range' in s.headers for s in xhr.sent)
+
+
+def test_resume_without_state_file_restarts(xhr, tmp_path):
+    dest = tmp_path / 'file.bin'
+    dest.write_bytes(b'\0' * len(DATA))
+    xhr.server = ranged_server()
+    requests.download('/file', dest, parts=2, resume=True)
+    assert dest.read_bytes() == DATA
+
+
+def test_file_changed_during_download(xhr):
+    original, changed = ranged_server(), ranged_server(DATA[::-1], etag='"v2"')
+    xhr.server = lambda sent: (changed if len(range_starts(xhr.sent)) > 1 else original)(sent)
+    with pytest.raises(requests.HTTPError):
+        requests.download('/file', parts=4, retries=2)
+    assert range_starts(xhr.sent) == [0, 2560]
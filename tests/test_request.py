@@ -0,0 +1,91 @@
+import gzip
+import json
+
+import pytest
+
+import requests
+from conftest import JsException
+
+
+def test_json_body(xhr):
+    requests.post('/json', json={'a': [1, 2]})
+    sent = xhr.sent[0]
+    assert sent.header_list == [('Content-Type', 'application/json')]
+    assert json.loads(sent.body) == {'a': [1, 2]}
+
+
+def test_compressed_json_body(xhr):
+    payload = {'values': list(range(10000))}
+    requests.post('/json', json=payload, compress=True)
+    sent = xhr.sent[0]
+    assert sent.header_list == [('Content-Type', 'application/json'), ('Content-Encoding', 'gzip')]
+    assert len(sent.body) < len(json.dumps(payload))
+    assert json.loads(gzip.decompress(sent.body)) == payload
+
+
+def test_compressed_raw_body(xhr):
+    requests.put('/csv', data='a,b\n1,2\n', headers={'Content-Type': 'text/csv'}, compress=True)
+    sent = xhr.sent[0]
+    assert sent.header_list == [('Content-Type', 'text/csv'), ('Content-Encoding', 'gzip')]
+    assert gzip.decompress(sent.body) == b'a,b\n1,2\n'
+
+
+def test_uncompressed_raw_body(xhr):
+    requests.post('/bytes', data=b'\x00\xff')
+    sent = xhr.sent[0]
+    assert sent.header_list == []
+    assert sent.body == b'\x00\xff'
+
+
+def test_compressed_json_array(xhr):
+    records = [{'event': 'click', 'n': n} for n in range(1000)]
+    requests.post('/telemetry', json=records, compress=True)
+    sent = xhr.sent[0]
+    assert sent.header_list == [('Content-Type', 'application/json'), ('Content-Encoding', 'gzip')]
+    assert json.loads(gzip.decompress(sent.body)) == records
+
+
+def test_falsy_json_is_sent(xhr):
+    requests.post('/json', json=[])
+    assert xhr.sent[0].body == b'[]'
+
+
+def test_bytes_like_bodies(xhr):
+    requests.post('/bytearray', data=bytearray(b'\x00\xff'))
+    requests.post('/memoryview', data=memoryview(b'\x00\xff'), compress=True)
+    assert xhr.sent[0].body == b'\x00\xff'
+    assert gzip.decompress(xhr.sent[1].body) == b'\x00\xff'
+
+
+def test_unsupported_data_is_rejected(xhr):
+    with pytest.raises(TypeError):
+        requests.post('/form', data=[('a', 1)])
+    assert xhr.sent == []
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_unserializable_json_is_rejected(xhr, compress):
+    with pytest.raises(requests.InvalidJSONError):
+        requests.post('/json', json={'when': object()}, compress=compress)
+    assert xhr.sent == []
+
+
+def test_data_takes_precedence_over_json(xhr):
+    requests.post('/json', data={'from': 'data'}, json={'from': 'json'}, compress=True)
+    sent = xhr.sent[0]
+    assert sent.header_list == [('Content-Type', 'application/json'), ('Content-Encoding', 'gzip')]
+    assert json.loads(gzip.decompress(sent.body)) == {'from': 'data'}
+
+
+def test_send_once(xhr):
+    requests.post('/form', data={'a': 1})
+    assert len(xhr.sent) == 1
+
+
+def test_network_error_raises_connection_error(xhr):
+    def drop(sent):
+        raise JsException('NetworkError')
+
+    xhr.server = drop
+    with pytest.raises(requests.ConnectionError):
+        requests.get('/file')
@@ -0,0 +1,113 @@
+import pytest
+
+import requests
+from conftest import FakePromise, FakeProxy, FakeXMLHttpRequest, JsException
+
+
+def test_streamed_response_leaks_no_proxies(xhr):
+    xhr.server = lambda sent: (200, {'Content-Type': 'application/octet-stream'}, b'\x00\x01' * 1000)
+    for _ in range(100):
+        response = requests.get('/file', stream=True)
+        assert response.raw == b'\x00\x01' * 1000
+    assert not FakeProxy.live
+
+
+def test_text_response_leaks_no_proxies(xhr):
+    xhr.server = lambda sent: (200, {'Content-Type': 'application/json'}, '{"a": 1}')
+    assert requests.get('/json').json() == {'a': 1}
+    assert not FakeProxy.live
+
+
+def test_request_bodies_leak_no_proxies(xhr):
+    requests.post('/json', json={'a': 1})
+    requests.post('/bytes', data=b'\x00\x01', compress=True)
+    assert not FakeProxy.live
+
+
+def test_close_and_context_manager(xhr):
+    xhr.server = lambda sent: (200, {}, b'body')
+    with requests.get('/file', stream=True) as response:
+        assert not FakeProxy.live
+    response.close()
+    assert response.raw == b'body'
+    assert response.status_code == 200
+    assert not FakeProxy.live
+
+
+def test_failed_body_read_leaks_no_proxies(xhr, monkeypatch):
+    def fail(self):
+        raise JsException('NotReadableError')
+
+    monkeypatch.setattr(FakePromise, 'result', fail)
+    with pytest.raises(requests.ConnectionError) as excinfo:
+        requests.get('/file', stream=True)
+    assert excinfo.value.__cause__ is not None
+    assert not FakeProxy.live
+
+
+def test_failed_send_leaks_no_proxies(xhr):
+    def drop(sent):
+        raise JsException('NetworkError')
+
+    xhr.server = drop
+    with pytest.raises(requests.ConnectionError) as excinfo:
+        requests.post('/json', json={'a': 1})
+    assert excinfo.value.__cause__ is not None
+    assert not FakeProxy.live
+
+
+def test_failed_open_leaks_no_proxies(xhr, monkeypatch):
+    def fail(self, method, url, asynchronous=True):
+        raise JsException('SyntaxError: Invalid URL')
+
+    monkeypatch.setattr(FakeXMLHttpRequest, 'open', fail)
+    with pytest.raises(requests.ConnectionError) as excinfo:
+        requests.get('http://[bad')
+    assert excinfo.value.__cause__ is not None
+    assert not FakeProxy.live
+
+
+def test_failed_body_serialization_leaks_no_proxies(xhr):
+    with pytest.raises(requests.InvalidJSONError) as excinfo:
+        requests.post('/json', json={'a': object()})
+    assert excinfo.value is not None
+    assert not FakeProxy.live
+    assert xhr.sent == []
+
+
+def test_response_has_no_instance_dict(xhr):
+    response = requests.get('/')
+    assert not hasattr(response, '__dict__')
+
+
+def test_text_of_binary_body(xhr):
+    xhr.server = lambda sent: (200, {}, 'héllo'.encode('utf-8') + b'\xff')
+    assert requests.get('/file', stream=True).text == 'héllo�'
+
+
+def test_text_honours_charset(xhr):
+    xhr.server = lambda sent: (200, {'Content-Type': 'text/plain; charset="latin-1"'}, 'héllo'.encode('latin-1'))
+    assert requests.get('/file', stream=True).text == 'héllo'
+
+
+def test_text_with_unknown_charset(xhr):
+    xhr.server = lambda sent: (200, {'Content-Type': 'text/plain; charset=bogus'}, 'héllo'.encode('utf-8'))
+    assert requests.get('/file', stream=True).text == 'héllo'
+
+
+def test_iter_content_yields_bytes(xhr):
+    xhr.server = lambda sent: (200, {}, b'abcdefg')
+    response = requests.get('/file', stream=True)
+    assert list(response.iter_content()) == [b'abcdefg']
+    chunks = list(response.iter_content(3))
+    assert chunks == [b'abc', b'def', b'g']
+    assert all(type(chunk) is bytes for chunk in chunks)
+    assert list(response.iter_content(3, decode_unicode=True)) == ['abc', 'def', 'g']
+
+
+def test_iter_content_of_text_response_yields_bytes(xhr):
+    xhr.server = lambda sent: (200, {'Content-Type': 'text/plain; charset=latin-1'}, 'héllo'.encode('latin-1'))
+    response = requests.get('/text')
+    assert response.raw == 'héllo'
+    assert list(response.iter_content(3)) == ['hél'.encode('latin-1'), b'lo']
+    assert list(response.iter_content(3, decode_unicode=True)) == ['hél', 'lo']
@@ -0,0 +1,76 @@
+import hashlib
+import io
+
+import pytest
+
+import requests
+
+BODY = b'0123456789' * 250
+
+
+@pytest.fixture
+def response(xhr):
+    xhr.server = lambda sent: (200, {}, BODY)
+    return requests.get('/file', stream=True)
+
+
+def test_save_to_path(response, tmp_path):
+    dest = tmp_path / 'file.bin'
+    assert response.save_to(dest) == len(BODY)
+    assert dest.read_bytes() == BODY
+
+
+def test_save_to_str_path(response, tmp_path):
+    dest = str(tmp_path / 'file.bin')
+    response.save_to(dest)
+    with open(dest, 'rb') as f:
+        assert f.read() == BODY
+
+
+def test_save_to_file_object(response):
+    f = io.BytesIO()
+    assert response.save_to(f) == len(BODY)
+    assert f.getvalue() == BODY
+    assert not f.closed
+
+
+def test_save_text_body(xhr):
+    xhr.server = lambda sent: (200, {}, 'héllo')
+    f = io.BytesIO()
+    assert requests.get('/text').save_to(f) == len('héllo'.encode('utf-8'))
+    assert f.getvalue() == 'héllo'.encode('utf-8')
+
+
+def test_save_text_body_in_its_charset(xhr, tmp_path):
+    body = 'héllo, wörld'.encode('latin-1')
+    xhr.server = lambda sent: (200, {'Content-Type': 'text/csv; charset=latin-1'}, body)
+    dest = tmp_path / 'file.csv'
+    requests.get('/text').save_to(dest, checksum='sha256:' + hashlib.sha256(body).hexdigest())
+    assert dest.read_bytes() == body
+
+
+def test_progress(response):
+    progress = []
+    response.save_to(io.BytesIO(), chunk_size=1000, progress=lambda written, total: progress.append((written, total)))
+    assert progress == [(1000, 2500), (2000, 2500), (2500, 2500)]
+
+
+def test_checksum_match(response, tmp_path):
+    dest = tmp_path / 'file.bin'
+    checksum = 'sha256:' + hashlib.sha256(BODY).hexdigest().upper()
+    assert response.save_to(dest, chunk_size=1000, checksum=checksum) == len(BODY)
+    assert dest.read_bytes() == BODY
+
+
+def test_checksum_mismatch_removes_file(response, tmp_path):
+    dest = tmp_path / 'file.bin'
+    with pytest.raises(requests.ChecksumError):
+        response.save_to(dest, checksum='md5:' + hashlib.md5(b'other').hexdigest())
+    assert not dest.exists()
+
+
+def test_checksum_mismatch_with_file_object(response):
+    f = io.BytesIO()
+    with pytest.raises(requests.ChecksumError):
+        response.save_to(f, checksum='sha1:00')
+    assert f.getvalue() == BODY